@@ -9,7 +9,15 @@ from abc import ABC, abstractmethod
 
 import numpy as np
 import scipy as sp
-import scipy.integrate
+import scipy.ndimage
+
+# Maximum number of (theta, xi, eta) samples evaluated at once by
+# `AttenuationObject.project_attenuation_into`.
+_BLOCK_SIZE = 2**20
+
+# Nodes and weights of the Gauss-Legendre quadrature rule on `[-1, 1]` used to
+# integrate along eta.
+_GL_NODES, _GL_WEIGHTS = np.polynomial.legendre.leggauss(32)
 
 
 class AttenuationObject(ABC):
@@ -30,27 +38,54 @@ class AttenuationObject(ABC):
 
         """
 
+    def attenuation_vec(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        """Return the attenuation factor μ for arrays of points `(x, y)`.
+
+        The arrays `x` and `y` must be broadcastable against each other and the
+        result has their broadcast shape.  The default implementation simply
+        calls `attenuation` on each point, so sub-classes should override this
+        with a vectorized version whenever possible.
+
+        The result should be of the floating point type of `x` and `y` (see
+        `result_dtype`), so that single precision inputs give single precision
+        results.
+
+        """
+        return np.vectorize(self.attenuation, otypes=[result_dtype(x, y)])(x, y)
+
     def project_attenuation(
         self, theta: float, xi: float, eta_range: (float, float)
     ) -> float:
         """Return the integrated attenuation factor for a given xi and theta
         value.
 
-        The integration is done along the specified range of eta values.
+        The integration is done along the specified range of eta values using
+        a fixed Gauss-Legendre quadrature rule.  Both `theta` and `xi` may also
+        be arrays.
 
         """
         # Although we don't know what the underlying object is (as this is an
         # abstract class), we know that we will be able get the attenuation at
         # a given `(x, y)` coordinate.  Based on this alone, we can calculate
         # the projected attenuation.
-        def integrand_eta(eta):
-            x = xi * np.cos(theta) + eta * np.sin(theta)
-            y = eta * np.cos(theta) -  xi * np.sin(theta)
-            #this gives us the attenuation factor for a specific x and y in the
-            #eta and xi coordinates
-            return (self.attenuation(x , y))
-        #Gives an integrand across all of eta
-        return (sp.integrate.quad(integrand_eta,eta_range[0],eta_range[1])[0])
+        x, y, weights = _quadrature_points(theta, xi, eta_range)
+        return self.attenuation_vec(x, y) @ weights
+
+    def project_attenuation_into(self, cos_theta, sin_theta, xi, eta, weights, out):
+        """Add the integrated attenuation factor for all combinations of theta
+        and xi to `out`, which is of shape `(theta, xi)`.
+
+        The values of theta are given through the arrays `cos_theta` and
+        `sin_theta`, and the integration is done at the points `eta` with the
+        corresponding quadrature `weights`.  This is used by `Projection` to
+        reuse the same points and weights for all objects.
+
+        The default implementation evaluates `attenuation_vec` at all points
+        for blocks of theta at a time, reusing the same buffers for each block.
+
+        """
+        for block, x, y in _rotated_blocks(cos_theta, sin_theta, xi, eta, out.dtype):
+            out[block] += self.attenuation_vec(x, y) @ weights
 
     def to_array(self, x, y):
         """Create a 2D array in the `(x, y)` coordinate of the attenuation.
@@ -60,11 +95,96 @@ class AttenuationObject(ABC):
         projection over the specified range.
 
         """
-        data = np.zeros((x.size, y.size), dtype=float)
-        for idx in np.ndindex(data.shape):
-            data[idx] = self.attenuation(x[idx[0]], y[idx[1]])
+        x, y = np.meshgrid(x, y, indexing="ij")
+        return self.attenuation_vec(x, y)
+
+
+def _rotated_blocks(cos_theta, sin_theta, xi, eta, dtype):
+    """Iterate over blocks of theta, yielding the slice of theta values and the
+    `(x, y)` coordinates of all `(theta, xi, eta)` points within the block.
+
+    The coordinates have shape `(theta, xi, eta)` and are written into the same
+    buffers for every block, so they are only valid until the next block.
+
+    """
+    block = max(1, min(cos_theta.size, _BLOCK_SIZE // (xi.size * eta.size)))
+    x = np.empty((block, xi.size, eta.size), dtype=dtype)
+    y = np.empty_like(x)
+    # Scratch space for the terms depending on only one of xi and eta.
+    eta_term = np.empty((block, 1, eta.size), dtype=dtype)
+    xi_term = np.empty((block, xi.size, 1), dtype=dtype)
+    xi = xi[:, None]
+
+    for start in range(0, cos_theta.size, block):
+        ct = cos_theta[start : start + block, None, None]
+        st = sin_theta[start : start + block, None, None]
+        n = ct.shape[0]
+        xb, yb = x[:n], y[:n]
+
+        # Rotate the (xi, eta) coordinates back into the original (x, y)
+        # coordinates.
+        np.multiply(xi, ct, out=xb)
+        xb += np.multiply(eta, st, out=eta_term[:n])
+        np.multiply(eta, ct, out=yb)
+        yb -= np.multiply(xi, st, out=xi_term[:n])
 
-        return data
+        yield slice(start, start + n), xb, yb
+
+
+def _quadrature_points(theta, xi, eta_range):
+    """Return the `(x, y)` coordinates of the Gauss-Legendre quadrature nodes
+    along eta for the given theta and xi, and the corresponding weights.
+
+    The nodes are along the last axis, so that `f(x, y) @ weights` integrates
+    `f` along eta.
+
+    """
+    cos_theta = np.cos(theta)[..., None]
+    sin_theta = np.sin(theta)[..., None]
+    xi = np.asarray(xi)[..., None]
+
+    # Map the quadrature nodes from `[-1, 1]` onto the range of eta.
+    half_width = (eta_range[1] - eta_range[0]) / 2
+    midpoint = (eta_range[0] + eta_range[1]) / 2
+    eta = half_width * _GL_NODES + midpoint
+
+    x = xi * cos_theta + eta * sin_theta
+    y = eta * cos_theta - xi * sin_theta
+    return x, y, half_width * _GL_WEIGHTS
+
+
+def result_dtype(x, y):
+    """Return the floating point type of the attenuation for the points `(x,
+    y)`.
+
+    This is the type of `x` and `y` if they are already floating point arrays,
+    and double precision otherwise.
+
+    """
+    return np.result_type(np.asarray(x), np.asarray(y), np.float32)
+
+
+def _clip_slab(start, direction, lower, upper, eta_min, eta_max):
+    """Clip the range `[eta_min, eta_max]` of the line `start + eta *
+    direction` to the part which lies within `[lower, upper]`.
+
+    The resulting range may be empty, in which case `eta_min > eta_max`.
+
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        eta_1 = (lower - start) / direction
+        eta_2 = (upper - start) / direction
+    # Lines parallel to the slab are either entirely inside or outside of it.
+    parallel = direction == 0
+    inside = (lower <= start) & (start <= upper)
+    slab_min = np.where(
+        parallel, np.where(inside, -np.inf, np.inf), np.minimum(eta_1, eta_2)
+    )
+    slab_max = np.where(
+        parallel, np.where(inside, np.inf, -np.inf), np.maximum(eta_1, eta_2)
+    )
+
+    return np.maximum(eta_min, slab_min), np.minimum(eta_max, slab_max)
 
 
 class Rectangle(AttenuationObject):
@@ -84,10 +204,42 @@ class Rectangle(AttenuationObject):
         self.attenuation_factor = attenuation_factor
 
     def attenuation(self, x, y):
-        if self.x1 <= x <= self.x2 and self.y1 <= y <= self.y2:
-            return self.attenuation_factor
-        else:
-            return 0
+        inside = (self.x1 <= x) & (x <= self.x2) & (self.y1 <= y) & (y <= self.y2)
+        return inside * self.attenuation_factor
+
+    def attenuation_vec(self, x, y):
+        inside = (x >= self.x1) & (x <= self.x2) & (y >= self.y1) & (y <= self.y2)
+        return np.multiply(inside, self.attenuation_factor, dtype=result_dtype(x, y))
+
+    def project_attenuation(self, theta, xi, eta_range):
+        """Return the integrated attenuation factor for a given xi and theta
+        value.
+
+        This is calculated exactly from the length of the line segment through
+        the rectangle, so `theta` and `xi` may also be arrays.
+
+        """
+        return self._project(np.cos(theta), np.sin(theta), xi, eta_range)
+
+    def project_attenuation_into(self, cos_theta, sin_theta, xi, eta, weights, out):
+        # The projection is exact, so only the range of eta is needed.
+        out += self._project(
+            cos_theta[:, None], sin_theta[:, None], xi[None, :], (eta[0], eta[-1])
+        )
+
+    def _project(self, cos_theta, sin_theta, xi, eta_range):
+        """Return the exact projection given cos(theta) and sin(theta)."""
+        # Along the line, x = x_xi + eta * sin(theta) and
+        # y = y_xi + eta * cos(theta).  Clip the range of eta to the slabs
+        # bounded by the sides of the rectangle in x and y in turn.
+        eta_min, eta_max = _clip_slab(
+            xi * cos_theta, sin_theta, self.x1, self.x2, min(eta_range), max(eta_range)
+        )
+        eta_min, eta_max = _clip_slab(
+            -xi * sin_theta, cos_theta, self.y1, self.y2, eta_min, eta_max
+        )
+        return self.attenuation_factor * np.maximum(eta_max - eta_min, 0)
+
 
 class Circle(AttenuationObject):
     """Implementat the `AttenuationObject` for a circle."""
@@ -99,13 +251,46 @@ class Circle(AttenuationObject):
         self.y0 = y0
         self.r = abs(r)
         self.attenuation_factor = attenuation_factor
+        # Distances are compared squared to avoid taking a square root.
+        self._r2 = self.r * self.r
 
     def attenuation(self, x, y):
+        dx = x - self.x0
+        dy = y - self.y0
+        return (dx * dx + dy * dy <= self._r2) * self.attenuation_factor
+
+    def attenuation_vec(self, x, y):
+        dx = x - self.x0
+        dy = y - self.y0
+        inside = dx * dx + dy * dy <= self._r2
+        return np.multiply(inside, self.attenuation_factor, dtype=result_dtype(x, y))
 
-        if (np.sqrt((x - self.x0)**2 + (y - self.y0)**2)) <= self.r:
-            return self.attenuation_factor
-        else:
-            return 0
+    def project_attenuation(self, theta, xi, eta_range):
+        """Return the integrated attenuation factor for a given xi and theta
+        value.
+
+        This is calculated exactly from the length of the chord through the
+        circle, so `theta` and `xi` may also be arrays.
+
+        """
+        return self._project(np.cos(theta), np.sin(theta), xi, eta_range)
+
+    def project_attenuation_into(self, cos_theta, sin_theta, xi, eta, weights, out):
+        # The projection is exact, so only the range of eta is needed.
+        out += self._project(
+            cos_theta[:, None], sin_theta[:, None], xi[None, :], (eta[0], eta[-1])
+        )
+
+    def _project(self, cos_theta, sin_theta, xi, eta_range):
+        """Return the exact projection given cos(theta) and sin(theta)."""
+        # Position of the center in the (xi, eta) coordinates.
+        xi_0 = self.x0 * cos_theta - self.y0 * sin_theta
+        eta_0 = self.x0 * sin_theta + self.y0 * cos_theta
+
+        half_chord = np.sqrt(np.maximum(self._r2 - (xi - xi_0) ** 2, 0))
+        eta_min = np.maximum(eta_0 - half_chord, min(eta_range))
+        eta_max = np.minimum(eta_0 + half_chord, max(eta_range))
+        return self.attenuation_factor * np.maximum(eta_max - eta_min, 0)
 
 
 class ObjectCollection(AttenuationObject):
@@ -129,6 +314,82 @@ class ObjectCollection(AttenuationObject):
             attenuation += obj.attenuation(x, y)
         return attenuation
 
+    def attenuation_vec(self, x, y):
+        """Return the overall attenuation from all objects in the collection
+        for arrays of points.
+
+        All circles and all rectangles within the collection are each
+        evaluated together, with only the remaining objects being evaluated
+        individually.
+
+        """
+        dtype = result_dtype(x, y)
+        x, y = np.broadcast_arrays(x, y)
+        circles, rectangles, others = self._shape_parameters(dtype)
+
+        attenuation = np.zeros(x.shape, dtype=dtype)
+        x = x[..., None]
+        y = y[..., None]
+        if circles is not None:
+            x0, y0, r2, attenuation_factor = circles
+            inside = (x - x0) ** 2 + (y - y0) ** 2 <= r2
+            attenuation += inside @ attenuation_factor
+        if rectangles is not None:
+            x1, x2, y1, y2, attenuation_factor = rectangles
+            inside = (x >= x1) & (x <= x2) & (y >= y1) & (y <= y2)
+            attenuation += inside @ attenuation_factor
+        for obj in others:
+            attenuation += obj.attenuation_vec(x[..., 0], y[..., 0])
+        return attenuation
+
+    def _shape_parameters(self, dtype):
+        """Split the objects into circles, rectangles and all other objects.
+
+        The parameters of the circles are returned as the arrays `(x0, y0,
+        r^2, attenuation_factor)`, and those of the rectangles as `(x1, x2, y1,
+        y2, attenuation_factor)`, each with one entry per shape.  If there are
+        no shapes of a kind, `None` is returned instead.  The arrays are of the
+        specified `dtype`.
+
+        """
+        circles = []
+        rectangles = []
+        others = []
+        for obj in self.objects:
+            # Sub-classes may change the behaviour, so only match exact types.
+            if type(obj) is Circle:
+                circles.append((obj.x0, obj.y0, obj._r2, obj.attenuation_factor))
+            elif type(obj) is Rectangle:
+                rectangles.append(
+                    (obj.x1, obj.x2, obj.y1, obj.y2, obj.attenuation_factor)
+                )
+            else:
+                others.append(obj)
+
+        circles = np.array(circles, dtype=dtype).T if circles else None
+        rectangles = np.array(rectangles, dtype=dtype).T if rectangles else None
+        return circles, rectangles, others
+
+    def project_attenuation(self, theta, xi, eta_range):
+        """Return the integrated attenuation factor from all objects in the
+        collection.
+
+        Each object is projected separately so that circles and rectangles use
+        their exact projections.  Both `theta` and `xi` may also be arrays.
+
+        """
+        attenuation = np.zeros(np.broadcast(theta, xi).shape)
+        for obj in self.objects:
+            attenuation += obj.project_attenuation(theta, xi, eta_range)
+        # Return a scalar rather than a 0-d array for scalar theta and xi.
+        return attenuation[()]
+
+    def project_attenuation_into(self, cos_theta, sin_theta, xi, eta, weights, out):
+        # Each object is projected separately so that circles and rectangles
+        # use their exact projections.
+        for obj in self.objects:
+            obj.project_attenuation_into(cos_theta, sin_theta, xi, eta, weights, out)
+
 
 class ImageObject(AttenuationObject):
     """Implement the `AttenuationObject` for images.
@@ -144,18 +405,53 @@ class ImageObject(AttenuationObject):
         self.image = image.copy().convert(mode="L")
         self.width, self.height = self.image.size
         self.scale_factor = max(self.width, self.height) / 2
+        # The pixel values indexed as `[y, x]`.
+        self.pixels = np.asarray(self.image, dtype=np.float32)
 
     def attenuation(self, x, y):
+        return float(self.attenuation_vec(np.asarray(x), np.asarray(y)))
+
+    def attenuation_vec(self, x, y):
         # We scale the input (x, y) coordinates so the correspond to a pixel
         # index.
-        x *= self.scale_factor
-        y *= self.scale_factor
+        x_idx = np.floor(x * self.scale_factor + self.width / 2).astype(int)
+        y_idx = np.floor(y * self.scale_factor + self.height / 2).astype(int)
+        x_idx, y_idx = np.broadcast_arrays(x_idx, y_idx)
+
+        # Get the pixel at the desired points within the image, and leave all
+        # other points as 0.
+        inside = (
+            (0 <= x_idx) & (x_idx < self.width) & (0 <= y_idx) & (y_idx < self.height)
+        )
+        attenuation = np.zeros(x_idx.shape, dtype=result_dtype(x, y))
+        attenuation[inside] = self.pixels[y_idx[inside], x_idx[inside]]
+        return attenuation
 
-        x += self.width / 2
-        y += self.height / 2
+    def project_attenuation(self, theta, xi, eta_range):
+        """Return the integrated attenuation factor for a given xi and theta
+        value.
 
-        # Get the pixel as the desired point if we're in the image, otherwise
-        # return 0.
-        if 0 <= x < self.width and 0 <= y < self.height:
-            return self.image.getpixel((x, y))
-        return 0
+        The image is sampled at all the quadrature nodes at once with linear
+        interpolation between the pixels, which gives a smoother integrand than
+        `attenuation_vec`.  Both `theta` and `xi` may also be arrays.
+
+        """
+        x, y, weights = _quadrature_points(theta, xi, eta_range)
+        return self._interpolate(x, y) @ weights
+
+    def project_attenuation_into(self, cos_theta, sin_theta, xi, eta, weights, out):
+        # As in `project_attenuation`, the image is sampled with linear
+        # interpolation between the pixels.
+        for block, x, y in _rotated_blocks(cos_theta, sin_theta, xi, eta, out.dtype):
+            out[block] += self._interpolate(x, y) @ weights
+
+    def _interpolate(self, x, y):
+        """Return the image at the points `(x, y)` using linear interpolation
+        between the pixels."""
+        # Pixel `(i, j)` covers `[i, i + 1) x [j, j + 1)` in the scaled
+        # coordinates, while `map_coordinates` places it at `(i, j)`.
+        x = x * self.scale_factor + self.width / 2 - 0.5
+        y = y * self.scale_factor + self.height / 2 - 0.5
+        return sp.ndimage.map_coordinates(
+            self.pixels, [y, x], order=1, mode="grid-constant", cval=0
+        )
@@ -28,7 +28,7 @@ def main():
     rectangle_2 = Rectangle(0, 1, 0, 1, .5)
     circle_1 = Circle(.8, .1, .05, 1)
     #attenuation for a rectangle
-    print('The attenuation at your point for the is:', rectangle_1.attenuation(7,0))
+    print('The attenuation at (-0.5, -0.5) is:', rectangle_1.attenuation(-0.5,-0.5))
     collection = ObjectCollection()
     #collection.append(rectangle_1)
     #collection.append(rectangle_2)
@@ -46,8 +46,12 @@ def main():
     myproj = Projection([0,np.pi],100,[-2,2],100)
     myproj.add_object(collection,(-2,2))
 
+    # The same axis is used for x and y, so build the grid once and evaluate
+    # the whole collection at once.
+    axis = np.linspace(-2, 2, 100)
+    x, y = np.meshgrid(axis, axis, indexing="ij")
     array_to_img(
-        collection.to_array(np.linspace(-2, 2, 100), np.linspace(-2, 2, 100))
+        collection.attenuation_vec(x, y)
     ).save(output_dir / "myproj1(.8, .1, .05, 1).png")
 
     array_to_img(
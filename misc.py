@@ -16,8 +16,18 @@ def array_to_img(data):
     black.
 
     """
-    max_val = data.max()
-    min_val = data.min()
-    diff = max_val - min_val
-    img = Image.fromarray((255 * (data - min_val) / diff).astype(np.uint8).T, mode="L")
+    # Work on a contiguous copy in the image's (row, column) order, so that the
+    # scaling can be done in place.  The values are rounded rather than
+    # truncated so that the maximum always maps to exactly 255.
+    arr = np.array(data.T, dtype=float, order="C")
+    min_val = arr.min()
+    diff = arr.max() - min_val
+
+    np.subtract(arr, min_val, out=arr)
+    # A constant array is mapped to black.
+    if diff > 0:
+        np.multiply(arr, 255, out=arr)
+        np.divide(arr, diff, out=arr)
+        np.rint(arr, out=arr)
+    img = Image.fromarray(arr.astype(np.uint8), mode="L")
     return img
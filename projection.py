@@ -13,7 +13,46 @@ values), we use a struct to store everything together.
 
 import numpy as np
 import scipy as sp
-import scipy.integrate
+import scipy.fft
+
+from attenuation_object import Circle, ObjectCollection, Rectangle
+
+try:
+    import projection_numba
+except ImportError:
+    projection_numba = None
+
+
+def _simpson_weights(x):
+    """Return the weights of the composite Simpson's rule for the evenly
+    spaced points `x`, such that `f(x) @ weights` integrates `f`.
+
+    The weights are the same as those used by `scipy.integrate.simpson`,
+    including the correction of the last interval for an even number of
+    points.
+
+    """
+    n = x.size
+    weights = np.zeros(n)
+    if n < 2:
+        return weights
+    h = (x[-1] - x[0]) / (n - 1)
+    if n == 2:
+        weights[:] = h / 2
+        return weights
+
+    # Simpson's rule over an odd number of points, h/3 [1, 4, 2, ..., 4, 1].
+    m = n if n % 2 == 1 else n - 1
+    weights[1 : m - 1 : 2] = 4 * h / 3
+    weights[2 : m - 1 : 2] = 2 * h / 3
+    weights[0] = weights[m - 1] = h / 3
+    if n % 2 == 0:
+        # Integrate the last interval with the quadratic through the last three
+        # points.
+        weights[-1] += 5 * h / 12
+        weights[-2] += 2 * h / 3
+        weights[-3] -= h / 12
+    return weights
 
 
 class Projection:
@@ -27,7 +66,15 @@ class Projection:
 
     """
 
-    def __init__(self, theta_range, theta_steps, xi_range, xi_steps):
+    def __init__(
+        self,
+        theta_range,
+        theta_steps,
+        xi_range,
+        xi_steps,
+        engine="cpu",
+        dtype=np.float32,
+    ):
         """Create a new empty projection object.
 
         The range of theta values and corresponding number of subdivisions are
@@ -35,7 +82,18 @@ class Projection:
         the range of xi values and corresponding number of subdivisions are
         specified in `(xi_min, xi_max)` and `xi_steps`.
 
+        The `engine` used to add objects is either `"cpu"`, or `"cuda"` to
+        project circles and rectangles on the GPU (which requires `numba`).
+        The data is stored with the specified `dtype`, which defaults to single
+        precision to halve the memory traffic.
+
         """
+        if engine not in ("cpu", "cuda"):
+            raise ValueError(f"Unknown engine {engine!r}.")
+        if engine == "cuda" and projection_numba is None:
+            raise RuntimeError("The cuda engine requires numba.")
+        self.engine = engine
+
         # Make sure that theta_min and theta_max are correctly ordered, and
         # calculate the step size.  Then repeat with xi.
         self.theta_min = min(theta_range)
@@ -48,19 +106,29 @@ class Projection:
         self.xi_steps = xi_steps
         self.xi_step_size = (self.xi_max - self.xi_min) / xi_steps
 
-        self.data = np.zeros((theta_steps, xi_steps))
+        # The values of theta and xi at each step index.
+        self.thetas = self.theta_min + np.arange(theta_steps) * self.theta_step_size
+        self.xis = self.xi_min + np.arange(xi_steps) * self.xi_step_size
+
+        self.data = np.zeros((theta_steps, xi_steps), dtype=dtype)
+
+        # The quadrature along eta used by `add_object`, cached for the last
+        # `(eta_range, eta_steps)` used.
+        self._eta_key = None
+        self._eta_nodes = None
+        self._eta_weights = None
 
     def theta(self, idx):
         """Return the value of theta corresponding to a particular index."""
-        return self.theta_min + idx * self.theta_step_size
+        return self.thetas[idx]
 
     def xi(self, idx):
         """Return xi at a particular step index."""
-        return self.xi_min + idx * self.xi_step_size
+        return self.xis[idx]
 
     def get_continuous(self, theta_idx, xi):
         """Return the value of the projection at any arbitrary point using
-        interpolation (for a given value of theta).
+        linear interpolation (for a given value of theta).
 
         This allows for the projection to be defined for all values in the
         range of xi values used in the projection. For values of xi which are
@@ -94,17 +162,106 @@ class Projection:
         xi_idx = (xi - self.xi_min) / self.xi_step_size
         if xi_idx < 0:
             return data[theta_idx, 0]
-        if xi_idx >= self.xi_steps:
+        if xi_idx >= self.xi_steps - 1:
             return data[theta_idx, -1]
-        return data[theta_idx, int(xi_idx)]
 
-    def add_object(self, obj, eta_range):
+        # Linearly interpolate between the two neighbouring steps.
+        idx = int(xi_idx)
+        frac = xi_idx - idx
+        return (1 - frac) * data[theta_idx, idx] + frac * data[theta_idx, idx + 1]
+
+    def get_continuous_vec(self, theta_idx, xi):
+        """This function behaves exactly like `get_continuous`, but accepts an
+        array of xi values and returns an array of the same shape."""
+        return self.get_continuous_custom_vec(theta_idx, xi, self.data)
+
+    def get_continuous_custom_vec(self, theta_idx, xi, data):
+        """This function behaves exactly like `get_continuous_custom`, but
+        accepts an array of xi values and returns an array of the same
+        shape."""
+        return np.interp(xi, self.xis, data[theta_idx])
+
+    def add_object(self, obj, eta_range, eta_steps=201):
         """Add an object to the projection.
+
+        Objects which cannot be projected exactly are integrated along eta
+        using Simpson's rule over `eta_steps` evenly spaced points in
+        `eta_range`.  The points and weights are computed once and reused for
+        subsequent objects added with the same `eta_range` and `eta_steps`.
+
+        With the `"cuda"` engine, circles and rectangles (including those
+        within a collection) are projected on the GPU.
+
+        """
+        eta, weights = self._eta_quadrature(eta_range, eta_steps)
+
+        # The samples are computed in the same precision as the data.
+        dtype = self.data.dtype
+        args = (
+            np.cos(self.thetas).astype(dtype),
+            np.sin(self.thetas).astype(dtype),
+            self.xis.astype(dtype),
+            eta,
+            weights,
+        )
+        if self.engine == "cuda":
+            self._add_object_cuda(obj, *args)
+        else:
+            obj.project_attenuation_into(*args, self.data)
+
+    def _eta_quadrature(self, eta_range, eta_steps):
+        """Return the points along eta and the corresponding Simpson's rule
+        weights, such that `f(eta) @ weights` integrates `f`.
+
+        The result is cached for the last `eta_range` and `eta_steps` used.
+
         """
-        #suppose to update the class
-        for theta_idx in range(self.theta_steps):
-            for xi_idx in range(self.xi_steps):
-                self.data[theta_idx,xi_idx] += obj.project_attenuation(self.theta(theta_idx), self.xi(xi_idx), eta_range)
+        key = (tuple(eta_range), eta_steps)
+        if self._eta_key != key:
+            eta = np.linspace(eta_range[0], eta_range[1], eta_steps)
+            weights = _simpson_weights(eta)
+            self._eta_key = key
+            self._eta_nodes = eta.astype(self.data.dtype)
+            self._eta_weights = weights.astype(self.data.dtype)
+        return self._eta_nodes, self._eta_weights
+
+    def _add_object_cuda(self, obj, cos_theta, sin_theta, xi, eta, weights):
+        """Add an object to the projection, projecting all circles and
+        rectangles on the GPU together and all other objects on the CPU."""
+        circles = []
+        rectangles = []
+        others = []
+        objects = [obj]
+        while objects:
+            obj = objects.pop()
+            # Sub-classes may change the behaviour, so only match exact types.
+            if type(obj) is ObjectCollection:
+                objects.extend(obj.objects)
+            elif type(obj) is Circle:
+                circles.append((obj.x0, obj.y0, obj.r, obj.attenuation_factor))
+            elif type(obj) is Rectangle:
+                rectangles.append(
+                    (obj.x1, obj.x2, obj.y1, obj.y2, obj.attenuation_factor)
+                )
+            else:
+                others.append(obj)
+
+        # The shapes are projected exactly, so only the range of eta is needed.
+        # Avoid copying the data to the GPU and back if there are no shapes.
+        if circles or rectangles:
+            projection_numba.project_shapes_cuda(
+                circles,
+                rectangles,
+                cos_theta,
+                sin_theta,
+                xi,
+                (eta[0], eta[-1]),
+                self.data,
+            )
+        for obj in others:
+            obj.project_attenuation_into(
+                cos_theta, sin_theta, xi, eta, weights, self.data
+            )
 
     def back_project(self):
         """Reconstruct the original image by back-projection.
@@ -113,11 +270,24 @@ class Projection:
         of xi steps in the original projection.
 
         """
-        matrix = np.zeros((self.xi_steps,self.xi_steps))
-        for x in range(self.xi_steps)
-            for y in range(self.xi_steps)
-                matrix[y,x] = sp.integrate.quad(project_attenuation(theta, xi = x * np.cos(theta) + y * np.sin(theta), (-2,2)),0,np.pi)[0]
+        return self._back_project_array(self.data)
+
+    def _back_project_array(self, data):
+        """Back-project the specified array, which must be of the same shape as
+        the projection data.
 
+        The image is sampled at the same values as xi in both the `x` and `y`
+        directions and is indexed as `[x, y]`, in the same way as
+        `AttenuationObject.to_array`.
+
+        """
+        x, y = np.meshgrid(self.xis, self.xis, indexing="ij")
+        image = np.zeros_like(x)
+        for theta_idx, theta in enumerate(self.thetas):
+            xi = x * np.cos(theta) - y * np.sin(theta)
+            image += self.get_continuous_custom_vec(theta_idx, xi, data)
+
+        return image * self.theta_step_size
 
     def filtered_back_project(self, f):
         """Reconstruct the original image by filtered back-projection.
@@ -126,7 +296,19 @@ class Projection:
         of xi steps in the original projection.
 
         The filter is an arbitrary function on floats and acts on the
-        wavenumber.
+        wavenumber, measured in cycles per unit of xi (without a factor of 2π).
+        With this convention, the ramp filter `abs` reconstructs the
+        attenuation μ directly.
+
+        The filter is applied to all values of theta at once with a batched
+        real FFT along xi.  The data is zero-padded to at least twice its
+        length so that the filtered projection does not wrap around.
 
         """
-        raise NotImplementedError()
+        nfft = sp.fft.next_fast_len(2 * self.xi_steps, real=True)
+        data = sp.fft.rfft(self.data, n=nfft, axis=1, workers=-1)
+        wavenumber = sp.fft.rfftfreq(nfft, d=self.xi_step_size)
+        data *= np.vectorize(f, otypes=[float])(wavenumber)[None, :]
+        filtered = sp.fft.irfft(data, n=nfft, axis=1, workers=-1)[:, : self.xi_steps]
+
+        return self._back_project_array(filtered)
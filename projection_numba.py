@@ -0,0 +1,117 @@
+"""Projection Numba
+===================
+
+CUDA kernels for computing the projection of simple shapes on the GPU.
+
+Each kernel uses one thread per `(theta, xi)`, with theta given through the
+precomputed values of cos(theta) and sin(theta).  The projections are computed
+exactly from the length of the line within the shape, in the same way as
+`Circle.project_attenuation` and `Rectangle.project_attenuation`, so that the
+result does not depend on the engine used.
+
+This module requires `numba` to be installed.
+
+"""
+from math import inf, sqrt
+
+from numba import cuda
+
+
+# Number of threads per block in each dimension when launching CUDA kernels.
+_CUDA_THREADS_PER_BLOCK = (32, 32)
+
+
+@cuda.jit(device=True)
+def _clip_slab(start, direction, lower, upper, eta_min, eta_max):
+    """Clip the range `[eta_min, eta_max]` of the line `start + eta *
+    direction` to the part which lies within `[lower, upper]`.
+
+    This is the scalar equivalent of `attenuation_object._clip_slab`.
+
+    """
+    if direction == 0:
+        # Lines parallel to the slab are either entirely inside or outside of
+        # it.
+        if lower <= start <= upper:
+            return eta_min, eta_max
+        return inf, -inf
+
+    eta_1 = (lower - start) / direction
+    eta_2 = (upper - start) / direction
+    return max(eta_min, min(eta_1, eta_2)), min(eta_max, max(eta_1, eta_2))
+
+
+@cuda.jit
+def _project_circle_cuda(
+    x0, y0, r, attenuation_factor, cos_thetas, sin_thetas, xis, eta_min, eta_max, out
+):
+    """Add the projection of a circle centered on `(x0, y0)` with radius `r`
+    to `out`."""
+    i, j = cuda.grid(2)
+    if i < out.shape[0] and j < out.shape[1]:
+        ct = cos_thetas[i]
+        st = sin_thetas[i]
+        # Position of the center in the (xi, eta) coordinates.
+        xi_0 = x0 * ct - y0 * st
+        eta_0 = x0 * st + y0 * ct
+
+        half_chord = sqrt(max(r * r - (xis[j] - xi_0) ** 2, 0.0))
+        length = min(eta_0 + half_chord, eta_max) - max(eta_0 - half_chord, eta_min)
+        out[i, j] += attenuation_factor * max(length, 0.0)
+
+
+@cuda.jit
+def _project_rectangle_cuda(
+    x1,
+    x2,
+    y1,
+    y2,
+    attenuation_factor,
+    cos_thetas,
+    sin_thetas,
+    xis,
+    eta_min,
+    eta_max,
+    out,
+):
+    """Add the projection of a rectangle bounded by `x1` and `x2` in the
+    `x`-axis, and `y1` and `y2` in the `y`-axis to `out`."""
+    i, j = cuda.grid(2)
+    if i < out.shape[0] and j < out.shape[1]:
+        ct = cos_thetas[i]
+        st = sin_thetas[i]
+        # Along the line, x = x_xi + eta * sin(theta) and
+        # y = y_xi + eta * cos(theta).  Clip the range of eta to the slabs
+        # bounded by the sides of the rectangle in x and y in turn.
+        lo, hi = _clip_slab(xis[j] * ct, st, x1, x2, eta_min, eta_max)
+        lo, hi = _clip_slab(-xis[j] * st, ct, y1, y2, lo, hi)
+        out[i, j] += attenuation_factor * max(hi - lo, 0.0)
+
+
+def project_shapes_cuda(
+    circles, rectangles, cos_thetas, sin_thetas, xis, eta_range, out
+):
+    """Add the projection of all the circles and rectangles along
+    `eta_range` to `out` on the GPU.
+
+    The circles are given as `(x0, y0, r, attenuation_factor)` and the
+    rectangles as `(x1, x2, y1, y2, attenuation_factor)`.  The arrays are
+    copied to the device once, and `out` is only copied back after all shapes
+    have been projected.
+
+    """
+    args = [cuda.to_device(arr) for arr in (cos_thetas, sin_thetas, xis)]
+    args += [min(eta_range), max(eta_range)]
+    d_out = cuda.to_device(out)
+
+    blocks = tuple(
+        (n + t - 1) // t for n, t in zip(out.shape, _CUDA_THREADS_PER_BLOCK)
+    )
+    for circle in circles:
+        _project_circle_cuda[blocks, _CUDA_THREADS_PER_BLOCK](*circle, *args, d_out)
+    for rectangle in rectangles:
+        _project_rectangle_cuda[blocks, _CUDA_THREADS_PER_BLOCK](
+            *rectangle, *args, d_out
+        )
+
+    d_out.copy_to_host(out)